@@ -3,6 +3,7 @@ import random
 import asyncio
 import pandas as pd
 import math
+from catalog_loader import CatalogLoader, SONGS_SCHEMA
 
 vikingdb_service = VikingDBService("api-vikingdb.mlp.ap-mya.byteplus.com", "ap-southeast-1")
 vikingdb_service.set_ak("Your BytePlus AK")
@@ -50,8 +51,8 @@ async def batch_upsert_data(df, batch_size=100):
         print(f"Batch {i+1}/{num_batches} completed. Records {start_idx+1} to {end_idx} processed.")
 
 async def main():
-    # Read the CSV file
-    df = pd.read_csv('/Users/bytedance/Documents/ByteDance/ModelArkDemo/VectorDB/songs_normalize.csv')
+    # Read the CSV file with compact dtypes (cached as Parquet for fast reloads)
+    df = CatalogLoader(SONGS_SCHEMA).load('/Users/bytedance/Documents/ByteDance/ModelArkDemo/VectorDB/songs_normalize.csv')
     await batch_upsert_data(df)
     print("All data has been uploaded successfully!")
 
@@ -1,5 +1,9 @@
 import streamlit as st
 from volcengine.viking_db import *
+from search_client import HedgedSearchClient
+
+# Latency budget for a single search, in seconds
+SEARCH_DEADLINE_SECONDS = 3.0
 
 # Initialize VikingDB service
 vikingdb_service = VikingDBService("api-vikingdb.mlp.ap-mya.byteplus.com", "ap-southeast-1")
@@ -9,15 +13,25 @@ vikingdb_service.set_sk("Your BytePlus SK")
 # Get the index (do this once during initialization)
 index = vikingdb_service.get_index("Ankur_Music_Collection", "Ankur_Music_Index")
 
+@st.cache_resource
+def get_search_client():
+    """Keep one search client across reruns so latency stats and cached results survive"""
+    return HedgedSearchClient(index)
+
+search_client = get_search_client()
+
 def search_similar_songs(song_name):
     try:
         # Search for similar songs using multimodal search
-        results = index.search_with_multi_modal(
+        results, source = search_client.search(
+            deadline=SEARCH_DEADLINE_SECONDS,
             text=song_name,  # Use the input song name as search text
             limit=5,  # Get top 5 similar songs
             need_instruction=False,
             output_fields=["song", "artist", "year", "genre", "popularity", "energy"]
         )
+        if source == "stale":
+            st.info("Search is slow right now, showing cached results.")
         return results
     except Exception as e:
         st.error(f"Error searching for songs: {str(e)}")
@@ -26,7 +40,10 @@ def search_similar_songs(song_name):
 def search_similar_energy_songs(energy_value, song_name):
     try:
         # Search for songs with similar energy levels
-        results = index.search_with_multi_modal(
+        # Recommendations are optional, so degrade to no results when over budget
+        results, _ = search_client.search(
+            deadline=SEARCH_DEADLINE_SECONDS,
+            fallback=list,
             text=song_name,  # We need to provide text parameter
             limit=20,  # Get more results initially to filter
             need_instruction=False,
@@ -103,4 +120,9 @@ if song_name:
                         """)
                         st.write("---")
         else:
-            st.warning("No similar songs found.")
\ No newline at end of file
+            st.warning("No similar songs found.")
+
+# Show tail latency of recent searches
+p99 = search_client.p99
+if p99 is not None:
+    st.sidebar.caption(f"Search latency p99: {p99 * 1000:.0f} ms")
@@ -0,0 +1,183 @@
+import os
+import time
+import json
+import hashlib
+import pandas as pd
+
+# Arrow-backed strings and Parquet/Feather caching need pyarrow; fall back to plain pandas without it
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    import pyarrow.feather as feather
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+# Cache metadata key holding the fingerprint of the schema and source CSV
+FINGERPRINT_KEY = b"catalog_fingerprint"
+
+# Column kinds: "category" for low-cardinality strings, "string" for free text,
+# "integer" for whole numbers downcast to the smallest type that fits, "float" for
+# numerics kept as float64 so uploaded values are not changed, "bool"
+FASHION_SCHEMA = {
+    "id": "integer",
+    "gender": "category",
+    "masterCategory": "category",
+    "subCategory": "category",
+    "articleType": "category",
+    "baseColour": "category",
+    "season": "category",
+    "year": "integer",
+    "usage": "category",
+    "productDisplayName": "string",
+    "image": "string",
+    "image_tos_path": "string",
+}
+
+SONGS_SCHEMA = {
+    "artist": "category",
+    "song": "string",
+    "duration_ms": "integer",
+    "explicit": "bool",
+    "year": "integer",
+    "popularity": "integer",
+    "danceability": "float",
+    "energy": "float",
+    "key": "integer",
+    "loudness": "float",
+    "mode": "integer",
+    "speechiness": "float",
+    "acousticness": "float",
+    "instrumentalness": "float",
+    "liveness": "float",
+    "valence": "float",
+    "tempo": "float",
+    "genre": "category",
+}
+
+class CatalogLoader:
+    """Class for loading catalog CSVs with compact dtypes and a Parquet/Feather cache"""
+
+    def __init__(self, schema, cache_format="parquet"):
+        if cache_format not in ("parquet", "feather"):
+            raise ValueError(f"Unsupported cache format: {cache_format}")
+        self.schema = schema
+        self.cache_format = cache_format
+        self.string_dtype = "string[pyarrow]" if HAS_PYARROW else "string"
+
+    def cache_path(self, csv_path):
+        """Return the cache file path that sits next to the CSV"""
+        return f"{os.path.splitext(csv_path)[0]}.{self.cache_format}"
+
+    def fingerprint(self, csv_path):
+        """Fingerprint the schema and the CSV's size and mtime, to tell when the cache is stale"""
+        stat = os.stat(csv_path)
+        payload = json.dumps({
+            "schema": self.schema,
+            "string_dtype": self.string_dtype,
+            "csv_size": stat.st_size,
+            "csv_mtime_ns": stat.st_mtime_ns,
+        }, sort_keys=True)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+    def cached_fingerprint(self, cache_path):
+        """Read the fingerprint stored in the cache metadata, or None if it is missing"""
+        try:
+            if self.cache_format == "parquet":
+                schema = pq.read_schema(cache_path)
+            else:
+                with pa.memory_map(cache_path) as source:
+                    schema = pa.ipc.open_file(source).schema
+        except Exception:
+            return None
+        value = (schema.metadata or {}).get(FINGERPRINT_KEY)
+        return value.decode('utf-8') if value else None
+
+    def to_numeric(self, series, downcast=None):
+        """Convert a column to numbers, leaving it as-is with a warning if any cell is not numeric"""
+        try:
+            return pd.to_numeric(series, downcast=downcast)
+        except (ValueError, TypeError) as e:
+            print(f"WARNING: Column {series.name} is not fully numeric ({e}), leaving it unconverted")
+            return series
+
+    def optimize(self, df):
+        """Apply the schema dtypes to an already loaded dataframe"""
+        for col, kind in self.schema.items():
+            if col not in df.columns:
+                continue
+            if kind == "category":
+                df[col] = df[col].astype("category")
+            elif kind == "string":
+                # Only convert real text columns (e.g. leave image objects from Hugging Face alone)
+                if pd.api.types.infer_dtype(df[col], skipna=True) in ("string", "empty"):
+                    df[col] = df[col].astype(self.string_dtype)
+            elif kind == "integer":
+                # Columns with missing values cannot be downcast and stay float64
+                df[col] = self.to_numeric(df[col], downcast="integer")
+            elif kind == "float":
+                df[col] = self.to_numeric(df[col])
+            elif kind == "bool":
+                if not df[col].isna().any():
+                    df[col] = df[col].astype(bool)
+        return df
+
+    def read_csv(self, csv_path):
+        """Parse the CSV, reading text columns straight into their compact dtypes"""
+        columns = pd.read_csv(csv_path, nrows=0).columns
+        dtype = {}
+        for col, kind in self.schema.items():
+            if col not in columns:
+                continue
+            if kind == "category":
+                dtype[col] = "category"
+            elif kind == "string":
+                dtype[col] = self.string_dtype
+        df = pd.read_csv(csv_path, dtype=dtype)
+        return self.optimize(df)
+
+    def save_cache(self, df, csv_path, fingerprint):
+        """Write the parsed catalog to the Parquet/Feather cache, tagged with its fingerprint"""
+        if not HAS_PYARROW:
+            print("pyarrow is not installed, skipping catalog cache")
+            return None
+
+        cache_path = self.cache_path(csv_path)
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            metadata = dict(table.schema.metadata or {})
+            metadata[FINGERPRINT_KEY] = fingerprint.encode('utf-8')
+            table = table.replace_schema_metadata(metadata)
+            if self.cache_format == "parquet":
+                pq.write_table(table, cache_path)
+            else:
+                feather.write_feather(table, cache_path)
+            print(f"Cached parsed catalog to {cache_path}")
+            return cache_path
+        except Exception as e:
+            print(f"WARNING: Failed to write catalog cache {cache_path}: {e}")
+            return None
+
+    def load(self, csv_path, use_cache=True):
+        """Load a catalog, reusing the cache while its fingerprint matches the schema and CSV"""
+        start = time.time()
+        cache_path = self.cache_path(csv_path)
+        # Fingerprint before parsing, so a CSV changed mid-load is not cached as current
+        fingerprint = self.fingerprint(csv_path)
+
+        if (use_cache and HAS_PYARROW and os.path.exists(cache_path)
+                and self.cached_fingerprint(cache_path) == fingerprint):
+            if self.cache_format == "parquet":
+                df = pd.read_parquet(cache_path)
+            else:
+                df = pd.read_feather(cache_path)
+            source = cache_path
+        else:
+            df = self.read_csv(csv_path)
+            source = csv_path
+            if use_cache:
+                self.save_cache(df, csv_path, fingerprint)
+
+        memory_mb = df.memory_usage(deep=True).sum() / (1024 * 1024)
+        print(f"Loaded {len(df)} records from {source} in {time.time() - start:.2f}s ({memory_mb:.1f} MB in memory)")
+        return df
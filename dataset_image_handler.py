@@ -8,6 +8,7 @@ import pandas as pd
 import tos
 import requests
 import traceback  # For detailed error tracking
+from catalog_loader import CatalogLoader, FASHION_SCHEMA
 
 class DatasetImageHandler:
     """Class for handling dataset download and image upload to BytePlus Object Storage"""
@@ -18,13 +19,15 @@ class DatasetImageHandler:
         self.tos_endpoint = tos_endpoint
         self.tos_region = tos_region
         self.tos_bucket = tos_bucket
+        self.catalog_loader = CatalogLoader(FASHION_SCHEMA)
         
     def load_dataset(self, dataset_name, split="train"):
         """Load dataset from Hugging Face"""
         try:
             print(f"Loading dataset {dataset_name} from Hugging Face...")
             dataset = load_dataset(dataset_name, split=split)
-            df = dataset.to_pandas()
+            # Use compact dtypes (categoricals, downcast numerics) for the catalog
+            df = self.catalog_loader.optimize(dataset.to_pandas())
             print(f"Dataset loaded with {len(df)} records")
             print(f"Columns in dataset: {df.columns.tolist()}")
             
@@ -5,6 +5,10 @@ import pandas as pd
 from PIL import Image
 import os
 from volcengine.viking_db import *
+from search_client import HedgedSearchClient
+
+# Latency budget for a single search, in seconds
+SEARCH_DEADLINE_SECONDS = 3.0
 
 # Initialize VikingDB service
 vikingdb_service = VikingDBService("api-vikingdb.mlp.ap-mya.byteplus.com", "ap-southeast-1")
@@ -14,6 +18,13 @@ vikingdb_service.set_sk("Your BytePlus SK")
 # Get the index (do this once during initialization)
 index = vikingdb_service.get_index("Ankur_Product_Image_Collection", "Ankur_Product_Image_Index")
 
+@st.cache_resource
+def get_search_client():
+    """Keep one search client across reruns so latency stats and cached results survive"""
+    return HedgedSearchClient(index)
+
+search_client = get_search_client()
+
 def convert_tos_to_http_url(tos_path):
     """Convert TOS path to HTTP URL"""
     if not tos_path or not isinstance(tos_path, str):
@@ -34,12 +45,15 @@ def convert_tos_to_http_url(tos_path):
 def search_with_text(text_query):
     """Search for similar images using text query"""
     try:
-        results = index.search_with_multi_modal(
+        results, source = search_client.search(
+            deadline=SEARCH_DEADLINE_SECONDS,
             text=text_query,
             limit=10,  # Get top 10 similar images
             need_instruction=False,
             output_fields=["productDisplayName", "baseColour", "image"]
         )
+        if source == "stale":
+            st.info("Search is slow right now, showing cached results.")
         return results
     except Exception as e:
         st.error(f"Error searching with text: {str(e)}")
@@ -55,12 +69,15 @@ def search_with_image(image_file):
         image_base64 = base64.b64encode(image_bytes).decode('utf-8')
         
         # Search using the image - add the required "base64://" prefix
-        results = index.search_with_multi_modal(
+        results, source = search_client.search(
+            deadline=SEARCH_DEADLINE_SECONDS,
             image=f"base64://{image_base64}",  # Add the required prefix
             limit=10,  # Get top 10 similar images
             need_instruction=False,
             output_fields=["productDisplayName", "baseColour", "image"]
         )
+        if source == "stale":
+            st.info("Search is slow right now, showing cached results.")
         return results
     except Exception as e:
         st.error(f"Error searching with image: {str(e)}")
@@ -132,4 +149,9 @@ with tab2:
         if st.button("Search for Similar Images"):
             with st.spinner('Searching for similar images...'):
                 results = search_with_image(uploaded_file)
-                display_results(results)
\ No newline at end of file
+                display_results(results)
+
+# Show tail latency of recent searches
+p99 = search_client.p99
+if p99 is not None:
+    st.sidebar.caption(f"Search latency p99: {p99 * 1000:.0f} ms")
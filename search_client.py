@@ -0,0 +1,168 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+def percentile(samples, pct):
+    """Return the given percentile of a list of samples, or None if it is empty"""
+    samples = sorted(samples)
+    if not samples:
+        return None
+    rank = min(len(samples) - 1, int(round(pct / 100 * (len(samples) - 1))))
+    return samples[rank]
+
+class HedgedSearchClient:
+    """Class for running VikingDB searches with latency budgets and hedged requests"""
+
+    def __init__(self, index, max_workers=8, window_size=200, min_samples=20,
+                 default_hedge_delay=0.5, hedge_budget=0.05, cache_size=256):
+        self.index = index
+        self.max_workers = max_workers
+        self.window_size = window_size
+        self.min_samples = min_samples
+        self.default_hedge_delay = default_hedge_delay
+        # Fraction of recent searches allowed to send a hedge, so a slow backend is not hit twice as hard
+        self.hedge_budget = hedge_budget
+        self.cache_size = cache_size
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        # End-to-end search() latencies, as seen by the caller
+        self.latencies = deque(maxlen=window_size)
+        # Backend call latencies including executor queue time, used for the hedge delay
+        self.call_latencies = deque(maxlen=window_size)
+        # Whether each recent search sent a hedge
+        self.recent_hedges = deque(maxlen=window_size)
+        # Backend calls submitted and not yet finished, running or queued
+        self.in_flight = 0
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    def latency_percentile(self, pct):
+        """Return the given percentile of recent end-to-end search latencies in seconds"""
+        with self.lock:
+            samples = list(self.latencies)
+        return percentile(samples, pct)
+
+    @property
+    def p95(self):
+        return self.latency_percentile(95)
+
+    @property
+    def p99(self):
+        return self.latency_percentile(99)
+
+    def hedge_delay(self):
+        """Delay before sending a second request: the p95 of backend calls, once enough samples exist"""
+        with self.lock:
+            samples = list(self.call_latencies)
+        if len(samples) < self.min_samples:
+            return self.default_hedge_delay
+        return percentile(samples, 95)
+
+    def reserve_hedge(self):
+        """Return True and count the hedge if the budget allows one and a worker is free"""
+        with self.lock:
+            if self.in_flight >= self.max_workers:
+                return False
+            # Include the hedge being asked for, so hedges never exceed the budget share
+            hedges = sum(self.recent_hedges) + 1
+            if hedges > self.hedge_budget * max(len(self.recent_hedges) + 1, self.min_samples):
+                return False
+            # Count the hedge right away so concurrent searches see it
+            self.recent_hedges.append(True)
+            return True
+
+    def cache_key(self, kwargs):
+        """Build a compact cache key from the search arguments (image queries can be large)"""
+        return hashlib.sha1(repr(sorted(kwargs.items())).encode('utf-8')).hexdigest()
+
+    def submit(self, kwargs, expires_at):
+        """Submit one backend call to the executor"""
+        with self.lock:
+            self.in_flight += 1
+        return self.executor.submit(self.timed_search, kwargs, time.monotonic(), expires_at)
+
+    def timed_search(self, kwargs, submitted_at, expires_at):
+        """Run one search call and record how long it took since it was submitted"""
+        try:
+            # Nobody is waiting for a call whose deadline passed while it sat in the queue
+            if time.monotonic() >= expires_at:
+                raise TimeoutError("Search deadline passed before the request left the queue")
+            results = self.index.search_with_multi_modal(**kwargs)
+            with self.lock:
+                self.call_latencies.append(time.monotonic() - submitted_at)
+            return results
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+    def search(self, deadline=3.0, fallback=None, **kwargs):
+        """Search with a latency budget, hedging slow requests
+
+        If no reply arrives within the hedge delay a second identical request is sent,
+        within the hedge budget and only when a worker is free, and the first successful
+        response wins. Time spent queued in the executor counts against the deadline.
+        When the deadline passes (or every attempt fails) the last cached results for
+        the same query are served, then the fallback callable, if given.
+
+        Returns a (results, source) tuple where source is "live", "stale" or "fallback".
+        """
+        start = time.monotonic()
+        try:
+            return self.search_within_deadline(start, deadline, fallback, kwargs)
+        finally:
+            with self.lock:
+                self.latencies.append(time.monotonic() - start)
+
+    def search_within_deadline(self, start, deadline, fallback, kwargs):
+        """Run the hedged search for search(), which records its end-to-end latency"""
+        key = self.cache_key(kwargs)
+        expires_at = start + deadline
+        pending = {self.submit(kwargs, expires_at)}
+        hedge_decided = False
+        hedged = False
+        last_error = None
+
+        try:
+            while pending:
+                remaining = expires_at - time.monotonic()
+                if remaining <= 0:
+                    break
+
+                timeout = remaining
+                if not hedge_decided:
+                    timeout = min(remaining, max(0.0, self.hedge_delay() - (time.monotonic() - start)))
+                done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    if future.exception() is None:
+                        results = future.result()
+                        with self.lock:
+                            self.cache[key] = results
+                            self.cache.move_to_end(key)
+                            if len(self.cache) > self.cache_size:
+                                self.cache.popitem(last=False)
+                        return results, "live"
+                    last_error = future.exception()
+
+                # Decide on a hedge once the first request is slow or has already failed
+                if not hedge_decided:
+                    hedge_decided = True
+                    if self.reserve_hedge():
+                        pending.add(self.submit(kwargs, expires_at))
+                        hedged = True
+        finally:
+            if not hedged:
+                with self.lock:
+                    self.recent_hedges.append(False)
+
+        # Losing or late requests keep running in the background and still record latency
+        with self.lock:
+            stale = self.cache.get(key)
+        if stale is not None:
+            return stale, "stale"
+        if fallback is not None:
+            return fallback(), "fallback"
+        if last_error is not None and not pending:
+            raise last_error
+        raise TimeoutError(f"Search did not complete within {deadline:.1f} seconds")
@@ -5,6 +5,25 @@ import pandas as pd
 import math
 import os
 import time
+import json
+import shutil
+import sys
+import numbers
+from catalog_loader import CatalogLoader, FASHION_SCHEMA
+
+# Error message fragments that point at a bad record rather than a systemic failure
+ROW_LEVEL_ERROR_MARKERS = ["invalid", "parameter", "field", "schema", "too long"]
+
+# Errors that affect every row (auth, connection, server, missing collection); checked first
+SYSTEMIC_ERROR_MARKERS = ["auth", "signature", "credential", "permission", "forbidden",
+                          "access denied", "connection", "network", "timed out", "timeout",
+                          "internal error", "server error", "service unavailable", "bad gateway",
+                          "not exist", "not found"]
+SYSTEMIC_EXCEPTION_NAMES = ["UnauthorizedException", "NoPermissionException", "InternalErrorException",
+                            "CollectionNotExistException", "IndexNotExistException"]
+
+class RateLimitExhausted(Exception):
+    """Raised when a batch still hits the rate limit after all retries"""
 
 class VectorDBUploader:
     """Class for uploading data to VectorDB"""
@@ -17,76 +36,225 @@ class VectorDBUploader:
         """Generate a random vector of specified dimension"""
         return [random.random() - 0.5 for _ in range(dim)]
     
-    async def batch_upsert_data(self, df, batch_size=10, vector_dim=512, delay_seconds=2):
-        """Insert data into VikingDB with TOS image paths"""
+    def row_to_field(self, row, vector_dim=512):
+        """Convert a dataframe row into a VikingDB field dictionary"""
+        # Create field dictionary with all available columns
+        field = {
+            "vector": self.gen_random_vector(vector_dim),
+        }
+        
+        # Add image path if available
+        if 'image' in row and pd.notna(row['image']):
+            field['image'] = row['image']
+        
+        # Add all available text fields from the dataset
+        for col in row.index:
+            if col in ['image']:
+                continue  # Skip the image column, we've already handled it
+            elif col in ['id', 'productDisplayName', 'gender', 'masterCategory', 
+                       'subCategory', 'articleType', 'baseColour', 'season', 
+                       'year', 'usage']:
+                if pd.notna(row[col]):
+                    # Convert to appropriate type based on the column
+                    if col in ['id', 'year']:
+                        field[col] = int(row[col]) if isinstance(row[col], numbers.Real) else 0
+                    else:
+                        field[col] = str(row[col])
+        
+        return field
+    
+    def write_dead_letters(self, dead_letter_path, rows, error):
+        """Append failed rows and their error to a JSON Lines dead-letter file"""
+        with open(dead_letter_path, 'a') as f:
+            for idx, row in rows:
+                entry = {
+                    "index": idx,
+                    "record": json.loads(row.to_json()),
+                    "error": str(error),
+                }
+                f.write(json.dumps(entry) + "\n")
+        print(f"Wrote {len(rows)} failed record(s) to {dead_letter_path}: {error}")
+    
+    async def upsert_with_retry(self, collection, data_batch, delay_seconds=2, max_retries=5):
+        """Upsert a batch, retrying rate-limit errors with exponential backoff"""
+        retry_count = 0
+        retry_delay = delay_seconds
+        
+        while True:
+            try:
+                await collection.async_upsert_data(data_batch)
+                return
+            except Exception as e:
+                if "token usage has reached the maximum limit" not in str(e):
+                    # If it's not a rate limit error, let the caller decide whether to split the batch
+                    raise
+                retry_count += 1
+                if retry_count >= max_retries:
+                    raise RateLimitExhausted(e) from e
+                print(f"Rate limit exceeded. Retry {retry_count}/{max_retries} after {retry_delay} seconds...")
+                await asyncio.sleep(retry_delay)
+                # Exponential backoff
+                retry_delay *= 2
+    
+    def is_row_level_error(self, error):
+        """Return True for errors caused by the data itself, which splitting can isolate
+        
+        Connection, auth and server errors affect every row, so they are not split.
+        """
+        message = str(error).lower()
+        if isinstance(error, (ConnectionError, TimeoutError, PermissionError, OSError)):
+            return False
+        if type(error).__name__ in SYSTEMIC_EXCEPTION_NAMES:
+            return False
+        # e.g. "invalid signature" must not be mistaken for an invalid record
+        if any(marker in message for marker in SYSTEMIC_ERROR_MARKERS):
+            return False
+        if isinstance(error, (ValueError, TypeError, OverflowError)):
+            return True
+        # VikingDB reports bad payloads as invalid request / parameter errors
+        if type(error).__name__ == "InvalidRequestException":
+            return True
+        return any(marker in message for marker in ROW_LEVEL_ERROR_MARKERS)
+    
+    async def upsert_bisecting(self, collection, rows, vector_dim=512, delay_seconds=2,
+                               dead_letter_path="dead_letter.jsonl"):
+        """Upsert rows, splitting failing batches in half until the bad rows are isolated
+        
+        Returns the number of rows committed. Rows that still fail on their own are
+        written to the dead-letter file. Errors that are not caused by individual rows
+        are re-raised and abort the run.
+        """
+        data_batch = []
+        valid_rows = []
+        for idx, row in rows:
+            try:
+                data_batch.append(Data(self.row_to_field(row, vector_dim)))
+                valid_rows.append((idx, row))
+            except Exception as e:
+                self.write_dead_letters(dead_letter_path, [(idx, row)], e)
+        
+        if not data_batch:
+            return 0
+        
+        try:
+            await self.upsert_with_retry(collection, data_batch, delay_seconds=delay_seconds)
+            return len(valid_rows)
+        except RateLimitExhausted as e:
+            # Splitting does not help against rate limits, so keep the rows for replay
+            self.write_dead_letters(dead_letter_path, valid_rows, e)
+            return 0
+        except Exception as e:
+            if not self.is_row_level_error(e):
+                raise
+            return await self.isolate_failures(collection, valid_rows, data_batch, e,
+                                               delay_seconds, dead_letter_path)
+    
+    async def isolate_failures(self, collection, rows, data_batch, error, delay_seconds=2,
+                               dead_letter_path="dead_letter.jsonl"):
+        """Split a failed batch in half and retry each half, recursing into halves that fail"""
+        if len(rows) == 1:
+            self.write_dead_letters(dead_letter_path, rows, error)
+            return 0
+        
+        mid = len(rows) // 2
+        print(f"Batch of {len(rows)} records failed ({error}). Splitting into {mid} and {len(rows) - mid}...")
+        halves = [(rows[:mid], data_batch[:mid]), (rows[mid:], data_batch[mid:])]
+        
+        committed = 0
+        failed_halves = []
+        for half_rows, half_batch in halves:
+            # Pace sub-batches like the outer loop to avoid rate limiting
+            await asyncio.sleep(delay_seconds)
+            try:
+                await self.upsert_with_retry(collection, half_batch, delay_seconds=delay_seconds)
+                committed += len(half_rows)
+            except RateLimitExhausted as e:
+                self.write_dead_letters(dead_letter_path, half_rows, e)
+            except Exception as e:
+                if not self.is_row_level_error(e):
+                    raise
+                failed_halves.append((half_rows, half_batch, e))
+        
+        for half_rows, half_batch, half_error in failed_halves:
+            committed += await self.isolate_failures(collection, half_rows, half_batch, half_error,
+                                                     delay_seconds, dead_letter_path)
+        return committed
+    
+    async def batch_upsert_data(self, df, batch_size=10, vector_dim=512, delay_seconds=2,
+                                dead_letter_path="dead_letter.jsonl"):
+        """Insert data into VikingDB with TOS image paths
+        
+        Returns the number of records committed. Records that cannot be upserted are
+        appended to dead_letter_path and can be re-ingested with replay_dead_letters.
+        """
         collection = await self.vikingdb_service.async_get_collection(self.collection_name)
         total_records = len(df)
         num_batches = math.ceil(total_records / batch_size)
+        total_committed = 0
         
         for i in range(num_batches):
             start_idx = i * batch_size
             end_idx = min((i + 1) * batch_size, total_records)
             batch_df = df[start_idx:end_idx]
             
-            data_batch = []
-            for idx, row in batch_df.iterrows():
-                # Create field dictionary with all available columns
-                field = {
-                    "vector": self.gen_random_vector(vector_dim),
-                }
-                
-                # Add image path if available
-                if 'image' in row and pd.notna(row['image']):
-                    field['image'] = row['image']
-                
-                # Add all available text fields from the dataset
-                for col in row.index:
-                    if col in ['image']:
-                        continue  # Skip the image column, we've already handled it
-                    elif col in ['id', 'productDisplayName', 'gender', 'masterCategory', 
-                               'subCategory', 'articleType', 'baseColour', 'season', 
-                               'year', 'usage']:
-                        if pd.notna(row[col]):
-                            # Convert to appropriate type based on the column
-                            if col in ['id', 'year']:
-                                field[col] = int(row[col]) if isinstance(row[col], (int, float)) else 0
-                            else:
-                                field[col] = str(row[col])
-                
-                data_batch.append(Data(field))
+            committed = await self.upsert_bisecting(collection, list(batch_df.iterrows()), vector_dim,
+                                                    delay_seconds, dead_letter_path)
+            total_committed += committed
+            print(f"Batch {i+1}/{num_batches} completed. Records {start_idx+1} to {end_idx} processed, "
+                  f"{committed}/{end_idx - start_idx} committed.")
             
-            # Implement retry logic with exponential backoff
-            max_retries = 5
-            retry_count = 0
-            retry_delay = delay_seconds
-            
-            while retry_count < max_retries:
-                try:
-                    await collection.async_upsert_data(data_batch)
-                    print(f"Batch {i+1}/{num_batches} completed. Records {start_idx+1} to {end_idx} processed.")
-                    
-                    # Add delay between batches to avoid rate limiting
-                    if i < num_batches - 1:  # No need to delay after the last batch
-                        print(f"Waiting {delay_seconds} seconds before next batch...")
-                        await asyncio.sleep(delay_seconds)
-                    
-                    # If successful, break out of retry loop
-                    break
-                    
-                except Exception as e:
-                    if "token usage has reached the maximum limit" in str(e):
-                        retry_count += 1
-                        print(f"Rate limit exceeded. Retry {retry_count}/{max_retries} after {retry_delay} seconds...")
-                        await asyncio.sleep(retry_delay)
-                        # Exponential backoff
-                        retry_delay *= 2
-                    else:
-                        # If it's not a rate limit error, re-raise it
-                        raise
-
-            # If we've exhausted all retries, report the error
-            if retry_count >= max_retries:
-                print(f"Failed to process batch {i+1} after {max_retries} retries. Continuing with next batch.")
+            # Add delay between batches to avoid rate limiting
+            if i < num_batches - 1:  # No need to delay after the last batch
+                print(f"Waiting {delay_seconds} seconds before next batch...")
+                await asyncio.sleep(delay_seconds)
+        
+        failed = total_records - total_committed
+        if failed:
+            print(f"{failed} record(s) failed and were written to {dead_letter_path}.")
+        return total_committed
+    
+    def load_dead_letters(self, dead_letter_path):
+        """Load records from a dead-letter file into a dataframe"""
+        records = []
+        indices = []
+        with open(dead_letter_path) as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    records.append(entry["record"])
+                    indices.append(entry["index"])
+        return pd.DataFrame(records, index=indices)
+    
+    async def replay_dead_letters(self, dead_letter_path="dead_letter.jsonl", batch_size=10,
+                                  vector_dim=512, delay_seconds=2):
+        """Re-ingest records from a dead-letter file, e.g. after fixing them by hand
+        
+        Records that still fail are collected in a timestamped retry file. Only once the
+        replay has finished is the original file appended to <path>.replayed and replaced
+        by the retry file, so an interrupted replay never loses records.
+        """
+        if not os.path.exists(dead_letter_path):
+            print(f"No dead-letter file found at {dead_letter_path}. Nothing to replay.")
+            return 0
+        
+        df = self.load_dead_letters(dead_letter_path)
+        retry_path = f"{dead_letter_path}.{time.strftime('%Y%m%d-%H%M%S')}.retry"
+        print(f"Replaying {len(df)} records from {dead_letter_path}")
+        
+        committed = await self.batch_upsert_data(df, batch_size=batch_size, vector_dim=vector_dim,
+                                                 delay_seconds=delay_seconds,
+                                                 dead_letter_path=retry_path)
+        
+        # Keep a history of everything that was replayed
+        with open(dead_letter_path) as src, open(f"{dead_letter_path}.replayed", 'a') as dst:
+            shutil.copyfileobj(src, dst)
+        
+        # Records that still fail become the new dead-letter file
+        if os.path.exists(retry_path):
+            os.replace(retry_path, dead_letter_path)
+        else:
+            os.remove(dead_letter_path)
+        return committed
 
 async def main():
     # VikingDB credentials
@@ -99,13 +267,21 @@ async def main():
         vikingdb_service, "Ankur_Product_Image_Collection"
     )
     
+    # Replay previously failed records: python vectordb_uploader.py replay [dead_letter.jsonl]
+    if len(sys.argv) > 1 and sys.argv[1] == "replay":
+        dead_letter_path = sys.argv[2] if len(sys.argv) > 2 else "dead_letter.jsonl"
+        committed = await uploader.replay_dead_letters(dead_letter_path)
+        print(f"Replay finished. {committed} records uploaded to VectorDB.")
+        return
+    
     # Load the processed dataset
     csv_path = "fashion_products_with_tos_paths.csv"
     if not os.path.exists(csv_path):
         print(f"Error: {csv_path} not found. Please run dataset_image_handler.py first.")
         return
     
-    df = pd.read_csv(csv_path)
+    # Load with compact dtypes; reloads come from the Parquet cache next to the CSV
+    df = CatalogLoader(FASHION_SCHEMA).load(csv_path)
     print(f"Loaded processed dataset with {len(df)} records")
     
     # Ask user for confirmation before proceeding
@@ -125,9 +301,13 @@ async def main():
         delay = 2
     
     # Upload the data to VectorDB with user-specified parameters
-    await uploader.batch_upsert_data(df, batch_size=batch_size, delay_seconds=delay)
+    committed = await uploader.batch_upsert_data(df, batch_size=batch_size, delay_seconds=delay)
     
-    print("All data has been uploaded to VectorDB successfully!")
+    if committed == len(df):
+        print("All data has been uploaded to VectorDB successfully!")
+    else:
+        print(f"Uploaded {committed}/{len(df)} records to VectorDB.")
+        print("Fix the records in dead_letter.jsonl and run: python vectordb_uploader.py replay")
 
 if __name__ == "__main__":
     # Run the main function